@@ -47,12 +47,42 @@ def mask_alignment(a, start=0, window_size=7):
     return masked_sites
 
 
-def encode_alignment(h):
+def _make_encoding_table():
     # Map anything that's not ACGT- to N
-    a = np.full(h.shape, -1, dtype=np.int8)
+    table = np.full(256, MISSING, dtype=np.int8)
     for code, char in enumerate(core.ALLELES):
-        a[h == char] = code
-    return a
+        table[ord(char)] = code
+    return table
+
+
+_ENCODING_TABLE = _make_encoding_table()
+
+
+@numba.njit(cache=True)
+def _encode_codepoints(codepoints, table, out):
+    for j in range(codepoints.shape[0]):
+        c = codepoints[j]
+        if c < table.shape[0]:
+            out[j] = table[c]
+        else:
+            out[j] = MISSING
+
+
+def encode_alignment(h):
+    h = np.asarray(h)
+    if h.dtype != np.dtype("U1"):
+        # Map anything that's not ACGT- to N
+        a = np.full(h.shape, MISSING, dtype=np.int8)
+        for code, char in enumerate(core.ALLELES):
+            a[h == char] = code
+        return a
+    # Work directly on the UCS4 code points of the characters, so that we
+    # encode the whole alignment in a single pass.
+    h = np.ascontiguousarray(h)
+    codepoints = h.reshape(-1).view(np.uint32)
+    a = np.empty(codepoints.shape[0], dtype=np.int8)
+    _encode_codepoints(codepoints, _ENCODING_TABLE, a)
+    return a.reshape(h.shape)
 
 
 def decode_alignment(a):
@@ -63,7 +93,17 @@ def decode_alignment(a):
 
 
 def base_composition(haplotype):
-    return collections.Counter(haplotype)
+    """
+    Returns a dictionary mapping each character in the specified haplotype
+    to the number of times it occurs, in order of first occurrence.
+    """
+    h = np.asarray(haplotype)
+    if h.dtype != np.dtype("U1"):
+        counter = collections.Counter(h.reshape(-1).tolist())
+        return {str(k): v for k, v in counter.items()}
+    codepoints = np.ascontiguousarray(h).reshape(-1).view(np.uint32)
+    values, first, counts = np.unique(codepoints, return_index=True, return_counts=True)
+    return {chr(values[j]): int(counts[j]) for j in np.argsort(first)}
 
 
 def compress_alignment(a):
@@ -111,28 +151,40 @@ class AlignmentStore(collections.abc.Mapping):
         return AlignmentStore(path, "a")
 
     def _flush(self, chunk):
+        if len(chunk) == 0:
+            return
         logger.debug(f"Flushing {len(chunk)} sequences")
         with self.env.begin(write=True) as txn:
-            for k, v in chunk:
-                txn.put(k.encode(), v)
+            with txn.cursor() as cursor:
+                cursor.putmulti((k.encode(), v) for k, v in chunk)
         logger.debug("Done")
 
-    def append(self, alignments, show_progress=False):
+    def append(self, alignments, show_progress=False, batch_size=1000, bar=None):
+        """
+        Append the specified mapping of strain names to alignments to
+        this store, committing in transactions of batch_size sequences.
+        If bar is specified, update this progress bar for each sequence
+        rather than creating a new one.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
         n = len(alignments)
-        chunk_size = 100
-        num_chunks = n // chunk_size
-        logger.info(f"Appending {n} alignments in {num_chunks} chunks")
-        bar = tqdm.tqdm(total=num_chunks, disable=not show_progress)
+        logger.info(f"Appending {n} alignments in batches of {batch_size}")
+        own_bar = bar is None
+        if own_bar:
+            bar = tqdm.tqdm(total=n, disable=not show_progress)
         chunk = []
         for k, v in alignments.items():
             v = np.char.upper(v)
             chunk.append((k, compress_alignment(v)))
-            if len(chunk) == chunk_size:
+            if len(chunk) == batch_size:
                 self._flush(chunk)
+                bar.update(len(chunk))
                 chunk = []
-                bar.update()
         self._flush(chunk)
-        bar.close()
+        bar.update(len(chunk))
+        if own_bar:
+            bar.close()
 
     def __contains__(self, key):
         with self.env.begin() as txn:
@@ -8,6 +8,8 @@ import sys
 import contextlib
 import dataclasses
 import datetime
+import functools
+import itertools
 
 import tqdm
 import tskit
@@ -20,12 +22,22 @@ import sc2ts
 from . import core
 from . import inference
 
+__cached_environment = None
+
 
 def get_environment():
     """
     Returns a dictionary describing the environment in which sc2ts
-    is currently running.
+    is currently running. This doesn't change during the lifetime of the
+    process, so we compute it once and cache the result.
     """
+    global __cached_environment
+    if __cached_environment is None:
+        __cached_environment = _get_environment()
+    return __cached_environment
+
+
+def _get_environment():
     env = {
         "os": {
             "system": platform.system(),
@@ -96,9 +108,17 @@ def info_alignments(store, verbose, log_file):
 @click.argument("fastas", type=click.Path(exists=True, dir_okay=False), nargs=-1)
 @click.option("-i", "--initialise", default=False, type=bool, help="Initialise store")
 @click.option("--no-progress", default=False, type=bool, help="Don't show progress")
+@click.option(
+    "--batch-size",
+    default=1000,
+    type=click.IntRange(min=1),
+    help="Number of alignments to write in each transaction",
+)
 @click.option("-v", "--verbose", count=True)
 @click.option("-l", "--log-file", default=None, type=click.Path(dir_okay=False))
-def import_alignments(store, fastas, initialise, no_progress, verbose, log_file):
+def import_alignments(
+    store, fastas, initialise, no_progress, batch_size, verbose, log_file
+):
     """
     Import the alignments from all FASTAS into STORE.
     """
@@ -107,10 +127,17 @@ def import_alignments(store, fastas, initialise, no_progress, verbose, log_file)
         a = sc2ts.AlignmentStore.initialise(store)
     else:
         a = sc2ts.AlignmentStore(store, "a")
+    # Use a single progress bar over all the input files. We count the
+    # sequences in a first pass so that we only have one file open at a time.
+    total = 0
     for fasta_path in fastas:
-        logging.info(f"Reading fasta {fasta_path}")
-        fasta = core.FastaReader(fasta_path)
-        a.append(fasta, show_progress=True)
+        with core.FastaReader(fasta_path) as fasta:
+            total += len(fasta)
+    with tqdm.tqdm(total=total, disable=no_progress) as bar:
+        for fasta_path in fastas:
+            logging.info(f"Reading fasta {fasta_path}")
+            with core.FastaReader(fasta_path) as fasta:
+                a.append(fasta, batch_size=batch_size, bar=bar)
     a.close()
 
 
@@ -182,6 +209,12 @@ def add_provenance(ts, output_file):
     ),
 )
 @click.option("--num-threads", default=0, type=int, help="Number of match threads")
+@click.option(
+    "--num-workers",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Number of worker processes for fetching alignments",
+)
 @click.option("--random-seed", default=42, type=int, help="Random seed for subsampling")
 @click.option("-p", "--precision", default=None, type=int, help="Match precision")
 @click.option("--no-progress", default=False, type=bool, help="Don't show progress")
@@ -197,6 +230,7 @@ def daily_extend(
     max_submission_delay,
     max_daily_samples,
     num_threads,
+    num_workers,
     random_seed,
     precision,
     no_progress,
@@ -227,6 +261,7 @@ def daily_extend(
             rng=rng,
             precision=precision,
             num_threads=num_threads,
+            num_workers=num_workers,
             show_progress=not no_progress,
         )
         for ts, date in ts_iter:
@@ -252,12 +287,25 @@ def validate(alignment_db, ts_file, verbose):
         inference.validate(ts, alignment_store, show_progress=True)
 
 
-def examine_recombinant(work):
-    base_ts = tszip.decompress(work.ts_path)
-    with sc2ts.AlignmentStore(work.alignment_db) as a:
-        data = sc2ts.utils.examine_recombinant(
-            work.strain, base_ts, a, num_mismatches=work.num_mismatches
-        )
+# Many recombinants share the same base tree sequence, so keep the most
+# recently decompressed one around in each worker process. Work is grouped
+# by base tree sequence, so we only need to keep one: these can be large.
+@functools.lru_cache(maxsize=1)
+def load_tsz(path):
+    return tszip.decompress(path)
+
+
+def examine_recombinants(work_chunk):
+    # All work items in a chunk share the same base ts and alignment store,
+    # so we only need to load them once.
+    base_ts = load_tsz(work_chunk[0].ts_path)
+    with sc2ts.AlignmentStore(work_chunk[0].alignment_db) as a:
+        data = [
+            sc2ts.utils.examine_recombinant(
+                work.strain, base_ts, a, num_mismatches=work.num_mismatches
+            )
+            for work in work_chunk
+        ]
     return data
 
 
@@ -311,32 +359,44 @@ def annotate_recombinants(
                 )
             )
 
+    # Group the work items into chunks that share a base tree sequence, so
+    # that each worker task only loads it once. We limit the size of the
+    # chunks so that we still spread the work across the pool when many
+    # recombinants share the same base.
+    max_chunk_size = 16
+    work.sort(key=lambda w: w.ts_path)
+    chunks = []
+    for _, group in itertools.groupby(work, key=lambda w: w.ts_path):
+        group = list(group)
+        for j in range(0, len(group), max_chunk_size):
+            chunks.append(group[j : j + max_chunk_size])
+
     results = {}
     with concurrent.futures.ProcessPoolExecutor(max_workers=None) as executor:
-        future_to_work = {
-            executor.submit(examine_recombinant, item): item for item in work
+        future_to_chunk = {
+            executor.submit(examine_recombinants, chunk): chunk for chunk in chunks
         }
 
-        bar = tqdm.tqdm(
-            concurrent.futures.as_completed(future_to_work), total=len(work)
-        )
-        for future in bar:
+        bar = tqdm.tqdm(total=len(work))
+        for future in concurrent.futures.as_completed(future_to_chunk):
+            chunk = future_to_chunk[future]
             try:
-                data = future.result()
+                chunk_data = future.result()
             except Exception as exc:
-                print(f"Work item: {future_to_work[future]} raised exception!")
+                print(f"Work items: {chunk} raised exception!")
                 raise exc
-            work = future_to_work[future]
-            results[work.recombinant] = data
-
-    tables = ts.dump_tables()
-    # This is probably very inefficient as we're writing back the metadata column
-    # many times
-    for recomb_node, metadata in tqdm.tqdm(results.items(), desc="Updating metadata"):
-        row = tables.nodes[recomb_node]
-        d = row.metadata
+            for item, data in zip(chunk, chunk_data):
+                results[item.recombinant] = data
+            bar.update(len(chunk))
+        bar.close()
+
+    node_metadata = {}
+    for recomb_node, metadata in results.items():
+        d = ts.node(recomb_node).metadata
         d["match_info"] = json.dumps(metadata)
-        tables.nodes[recomb_node] = row.replace(metadata=d)
+        node_metadata[recomb_node] = d
+    tables = ts.dump_tables()
+    sc2ts.utils.update_node_metadata(tables, node_metadata)
 
     ts = tables.tree_sequence()
     logging.info("Compressing output")
@@ -33,6 +33,15 @@ class FastaReader(collections.abc.Mapping):
         self.reader = pyfaidx.Fasta(str(path))
         self.keys = list(self.reader.keys())
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.reader.close()
+
     def __getitem__(self, key):
         x = self.reader[key]
         h = np.array(x).astype(str)
@@ -48,8 +57,17 @@ class FastaReader(collections.abc.Mapping):
 data_path = pathlib.Path(__file__).parent / "data"
 
 
+__cached_problematic_sites = None
+
+
 def get_problematic_sites():
-    return np.loadtxt(data_path / "problematic_sites.txt", dtype=np.int64)
+    global __cached_problematic_sites
+    if __cached_problematic_sites is None:
+        sites = np.loadtxt(data_path / "problematic_sites.txt", dtype=np.int64)
+        # Callers share this array, so make sure it can't be updated in place.
+        sites.flags.writeable = False
+        __cached_problematic_sites = sites
+    return __cached_problematic_sites
 
 
 __cached_reference = None
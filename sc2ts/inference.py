@@ -3,7 +3,10 @@ import logging
 import datetime
 import dataclasses
 import collections
+import contextlib
+import concurrent.futures as cf
 import io
+import multiprocessing
 
 import tqdm
 import tskit
@@ -31,17 +34,24 @@ def mirror_ts_coordinates(ts):
 
     Makes a bunch of simplifying assumptions.
     """
-    assert ts.num_migrations == 0
-    assert ts.discrete_genome
-    L = ts.sequence_length
     tables = ts.dump_tables()
+    _mirror_tables_coordinates(tables)
+    return tables.tree_sequence()
+
+
+def _mirror_tables_coordinates(tables):
+    # Mirror the coordinates of the specified tables in place.
+    assert tables.migrations.num_rows == 0
+    L = tables.sequence_length
+    # Equivalent to ts.discrete_genome
+    for x in [[L], tables.edges.left, tables.edges.right, tables.sites.position]:
+        assert np.all(np.floor(x) == x)
     left = tables.edges.left
     right = tables.edges.right
     tables.edges.left = mirror(right, L)
     tables.edges.right = mirror(left, L)
     tables.sites.position = mirror(tables.sites.position, L - 1)
     tables.sort()
-    return tables.tree_sequence()
 
 
 def initial_ts():
@@ -129,10 +139,9 @@ def increment_time(date, ts):
     return tables.tree_sequence()
 
 
-def _validate_samples(ts, samples, alignment_store, show_progress):
+def _validate_samples(ts, samples, alignment_store, keep_sites, show_progress):
     strains = [ts.node(u).metadata["strain"] for u in samples]
     G = np.zeros((ts.num_sites, len(samples)), dtype=np.int8)
-    keep_sites = ts.sites_position.astype(int)
     strains_iter = enumerate(strains)
     with tqdm.tqdm(
         strains_iter,
@@ -168,6 +177,7 @@ def validate(ts, alignment_store, show_progress=False):
     representing the original alignments.
     """
     samples = ts.samples()
+    keep_sites = ts.sites_position.astype(int)
     chunk_size = 10**3
     offset = 0
     num_chunks = ts.num_samples // chunk_size
@@ -176,11 +186,11 @@ def validate(ts, alignment_store, show_progress=False):
     ):
         chunk = samples[offset : offset + chunk_size]
         offset += chunk_size
-        _validate_samples(ts, chunk, alignment_store, show_progress)
+        _validate_samples(ts, chunk, alignment_store, keep_sites, show_progress)
 
     if ts.num_samples % chunk_size != 0:
         chunk = samples[offset:]
-        _validate_samples(ts, chunk, alignment_store, show_progress)
+        _validate_samples(ts, chunk, alignment_store, keep_sites, show_progress)
 
 
 @dataclasses.dataclass
@@ -257,28 +267,147 @@ def daily_extend(
     max_submission_delay=None,
     max_daily_samples=None,
     num_threads=None,
+    num_workers=0,
     precision=None,
     rng=None,
 ):
+    """
+    Sequentially extend base_ts with the samples for each day in the
+    metadata DB, yielding the (ts, date) after each day. If num_workers > 0,
+    fetch alignments for large days in a pool of worker processes, which
+    is created once and shared across all days. The pool uses the "spawn"
+    start method, so scripts using this must guard their entry point with
+    ``if __name__ == "__main__"``.
+    """
     start_day = last_date(base_ts)
     last_ts = base_ts
-    for date in metadata_db.get_days(start_day):
-        ts = extend(
-            alignment_store=alignment_store,
-            metadata_db=metadata_db,
-            date=date,
-            base_ts=last_ts,
-            num_mismatches=num_mismatches,
-            max_hmm_cost=max_hmm_cost,
-            show_progress=show_progress,
-            max_submission_delay=max_submission_delay,
-            max_daily_samples=max_daily_samples,
-            num_threads=num_threads,
-            precision=precision,
-            rng=rng,
-        )
-        yield ts, date
-        last_ts = ts
+    with contextlib.ExitStack() as exit_stack:
+        executor = None
+        if num_workers > 0:
+            # LMDB environments can't be shared across a fork, so use spawn.
+            executor = exit_stack.enter_context(
+                cf.ProcessPoolExecutor(
+                    max_workers=num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            )
+        for date in metadata_db.get_days(start_day):
+            ts = extend(
+                alignment_store=alignment_store,
+                metadata_db=metadata_db,
+                date=date,
+                base_ts=last_ts,
+                num_mismatches=num_mismatches,
+                max_hmm_cost=max_hmm_cost,
+                show_progress=show_progress,
+                max_submission_delay=max_submission_delay,
+                max_daily_samples=max_daily_samples,
+                num_threads=num_threads,
+                executor=executor,
+                precision=precision,
+                rng=rng,
+            )
+            yield ts, date
+            last_ts = ts
+
+
+def fetch_alignment(alignment_store, strain, problematic_sites):
+    """
+    Return the alignment for the specified strain along with its
+    encoded and masked version.
+    """
+    logger.debug(f"Getting alignment for {strain}")
+    alignment = alignment_store[strain]
+    logger.debug(f"Encoding alignment")
+    ma = alignments.encode_and_mask(alignment)
+    # Always mask the problematic_sites as well. We need to do this
+    # for follow-up matching to inspect recombinants, as tsinfer
+    # needs us to keep all sites in the table when doing mirrored
+    # coordinates.
+    ma.alignment[problematic_sites] = -1
+    return alignment, ma
+
+
+def _fetch_alignments_worker(store_path, strains):
+    # Runs in a worker process, so we open our own handle on the store.
+    problematic_sites = core.get_problematic_sites()
+    with alignments.AlignmentStore(store_path) as alignment_store:
+        return [
+            fetch_alignment(alignment_store, strain, problematic_sites)
+            for strain in strains
+        ]
+
+
+# Fetching in worker processes only pays off when there's enough work
+# to outweigh sending the alignments back to the parent.
+FETCH_ALIGNMENTS_MIN_PARALLEL = 100
+FETCH_ALIGNMENTS_CHUNK_SIZE = 50
+
+
+def fetch_alignments(strains, alignment_store, executor=None, show_progress=False):
+    """
+    Return the list of (alignment, masked_alignment) tuples for the
+    specified strains, in order. If a process pool executor is specified,
+    the store is an AlignmentStore and there are at least
+    FETCH_ALIGNMENTS_MIN_PARALLEL strains, decompress and encode the
+    alignments in the worker processes.
+    """
+    parallel = (
+        executor is not None
+        and isinstance(alignment_store, alignments.AlignmentStore)
+        and len(strains) >= FETCH_ALIGNMENTS_MIN_PARALLEL
+    )
+    ret = []
+    with tqdm.tqdm(desc="Fetch", total=len(strains), disable=not show_progress) as bar:
+        if parallel:
+            store_path = alignment_store.env.path()
+            chunk_size = FETCH_ALIGNMENTS_CHUNK_SIZE
+            chunks = [
+                strains[j : j + chunk_size] for j in range(0, len(strains), chunk_size)
+            ]
+            results = executor.map(
+                _fetch_alignments_worker, [store_path] * len(chunks), chunks
+            )
+            for chunk, chunk_results in zip(chunks, results):
+                ret.extend(chunk_results)
+                bar.update(len(chunk))
+        else:
+            problematic_sites = core.get_problematic_sites()
+            for strain in strains:
+                ret.append(fetch_alignment(alignment_store, strain, problematic_sites))
+                bar.update()
+    return ret
+
+
+def get_genotypes(
+    samples, *, alignment_store, base_ts, executor=None, show_progress=False
+):
+    """
+    Return the genotype matrix for the specified samples at the sites in
+    base_ts, updating the Sample objects with the alignment QC information.
+    """
+    # Note: there's not a lot of point in making the G matrix here,
+    # we should just pass on the encoded alignments to the matching
+    # algorithm directly through the Sample class, and let it
+    # do the low-level haplotype storage.
+    G = np.zeros((base_ts.num_sites, len(samples)), dtype=np.int8)
+    keep_sites = base_ts.sites_position.astype(int)
+
+    fetched = fetch_alignments(
+        [sample.strain for sample in samples],
+        alignment_store,
+        executor=executor,
+        show_progress=show_progress,
+    )
+    for j, (sample, (alignment, ma)) in enumerate(zip(samples, fetched)):
+        sample.alignment = alignment
+        G[:, j] = ma.alignment[keep_sites]
+        sample.alignment_qc = ma.qc_summary()
+        sample.masked_sites = ma.masked_sites
+
+    masked_per_sample = np.mean([len(sample.masked_sites)])
+    logger.info(f"Masked average of {masked_per_sample:.2f} nucleotides per sample")
+    return G
 
 
 def match(
@@ -289,44 +418,19 @@ def match(
     num_mismatches=None,
     show_progress=False,
     num_threads=None,
+    executor=None,
     precision=None,
     mirror_coordinates=False,
 ):
     logger.info(f"Start match for {len(samples)}")
 
-    # Note: there's not a lot of point in making the G matrix here,
-    # we should just pass on the encoded alignments to the matching
-    # algorithm directly through the Sample class, and let it
-    # do the low-level haplotype storage.
-    G = np.zeros((base_ts.num_sites, len(samples)), dtype=np.int8)
-    keep_sites = base_ts.sites_position.astype(int)
-    problematic_sites = core.get_problematic_sites()
-
-    samples_iter = enumerate(samples)
-    with tqdm.tqdm(
-        samples_iter,
-        desc=f"Fetch",
-        total=len(samples),
-        disable=not show_progress,
-    ) as bar:
-        for j, sample in bar:
-            logger.debug(f"Getting alignment for {sample.strain}")
-            alignment = alignment_store[sample.strain]
-            sample.alignment = alignment
-            logger.debug(f"Encoding alignment")
-            ma = alignments.encode_and_mask(alignment)
-            # Always mask the problematic_sites as well. We need to do this
-            # for follow-up matching to inspect recombinants, as tsinfer
-            # needs us to keep all sites in the table when doing mirrored
-            # coordinates.
-            ma.alignment[problematic_sites] = -1
-            G[:, j] = ma.alignment[keep_sites]
-            sample.alignment_qc = ma.qc_summary()
-            sample.masked_sites = ma.masked_sites
-
-    masked_per_sample = np.mean([len(sample.masked_sites)])
-    logger.info(f"Masked average of {masked_per_sample:.2f} nucleotides per sample")
-
+    G = get_genotypes(
+        samples,
+        alignment_store=alignment_store,
+        base_ts=base_ts,
+        executor=executor,
+        show_progress=show_progress,
+    )
     match_tsinfer(
         samples=samples,
         ts=base_ts,
@@ -352,6 +456,7 @@ def extend(
     max_submission_delay=None,
     max_daily_samples=None,
     num_threads=None,
+    executor=None,
     precision=None,
     rng=None,
 ):
@@ -376,6 +481,7 @@ def extend(
         num_mismatches=num_mismatches,
         show_progress=show_progress,
         num_threads=num_threads,
+        executor=executor,
         precision=precision,
     )
     ts = increment_time(date, base_ts)
@@ -711,9 +817,12 @@ def insert_recombinants(ts):
     """
     recombinants = collections.defaultdict(list)
     edges_to_delete = []
+    # Count the edges for each child once, so that we only need to find the
+    # edges for the samples that are actually recombinant.
+    num_child_edges = np.bincount(ts.edges_child, minlength=ts.num_nodes)
     for u in ts.samples(time=0):
-        edges = np.where(ts.edges_child == u)[0]
-        if len(edges) > 1:
+        if num_child_edges[u] > 1:
+            edges = np.flatnonzero(ts.edges_child == u)
             path = []
             for eid in edges:
                 edge = ts.edge(eid)
@@ -1023,10 +1132,20 @@ def match_tsinfer(
         num_mismatches = 1000
 
     input_ts = ts
+    # Make a single copy of the tables, mirroring the coordinates if needed.
+    tables = ts.dump_tables()
     if mirror_coordinates:
-        ts = mirror_ts_coordinates(ts)
+        _mirror_tables_coordinates(tables)
         genotypes = genotypes[::-1]
 
+    # This is just working around tsinfer's input checking logic. The actual value
+    # we're incrementing by has no effect.
+    tables.nodes.time += 1
+    tables.mutations.time += 1
+    ancestral_state = tables.sites.ancestral_state.view("S1").astype(str)
+    ts = tables.tree_sequence()
+    del tables
+
     sd = convert_tsinfer_sample_data(ts, genotypes)
 
     L = int(ts.sequence_length)
@@ -1038,15 +1157,6 @@ def match_tsinfer(
         match_samples=False,
     )
 
-    # This is just working around tsinfer's input checking logic. The actual value
-    # we're incrementing by has no effect.
-    tables = ts.dump_tables()
-    tables.nodes.time += 1
-    tables.mutations.time += 1
-    ancestral_state = tables.sites.ancestral_state.view("S1").astype(str)
-    ts = tables.tree_sequence()
-    del tables
-
     manager = Matcher(
         sd,
         ts,
@@ -1379,9 +1489,13 @@ def attach_tree(parent_ts, parent_tables, attach_path, reversions, child_ts, dat
                 seg.left, seg.right, parent=seg.parent, child=node_id_map[child]
             )
 
-    # Add the mutations.
-    for site in child_ts.sites():
-        parent_site_id = parent_ts.site(position=site.position).id
+    # Add the mutations. Look up all the parent site IDs in one go.
+    parent_site_ids = np.searchsorted(parent_ts.sites_position, child_ts.sites_position)
+    if np.any(parent_site_ids >= parent_ts.num_sites) or np.any(
+        parent_ts.sites_position[parent_site_ids] != child_ts.sites_position
+    ):
+        raise ValueError("Child sites must be present in the parent")
+    for site, parent_site_id in zip(child_ts.sites(), parent_site_ids):
         for mutation in site.mutations:
             assert mutation.node != tree.root
             parent_tables.mutations.add_row(
@@ -1078,7 +1078,7 @@ class TreeInfo:
             closest_recombinant, path_length = self._get_closest_recombinant(tree, node)
             sample_is_recombinant = False
             if closest_recombinant != -1:
-                recomb_date = self.ts.node(closest_recombinant).metadata["date_added"]
+                recomb_date = self.nodes_metadata[closest_recombinant]["date_added"]
                 sample_is_recombinant = recomb_date == str(node_summary["date"])
             summary = {
                 "recombinant": closest_recombinant,
@@ -1291,20 +1291,23 @@ def examine_recombinant(strain, ts, alignment_store, num_mismatches=3):
     # This is just an annoying detail of tsinfer's implementation.
     ts = pad_sites(ts)
     num_mismatches = num_mismatches
+    # The genotypes are the same in both directions, so only fetch and
+    # encode the alignment once.
+    G = sc2ts.get_genotypes(
+        [sc2ts.Sample({"strain": strain})], alignment_store=alignment_store, base_ts=ts
+    )
     data = []
     for mirror in [True, False]:
         sample = sc2ts.Sample({"strain": strain})
-        samples = sc2ts.match(
+        sc2ts.match_tsinfer(
             samples=[sample],
-            alignment_store=alignment_store,
-            base_ts=ts,
+            ts=ts,
+            genotypes=G,
             num_mismatches=num_mismatches,
             precision=14,
             num_threads=0,
             mirror_coordinates=mirror,
         )
-        assert len(samples) == 1
-        sample = samples[0]
         data.append(
             {
                 "strain": strain,
@@ -2085,6 +2088,7 @@ def add_breakpoints_to_recombinant_metadata(ts):
     metadata.
     """
     tables = ts.dump_tables()
+    node_metadata = {}
     iterator = get_recombinant_edges(ts).items()
     for child, edges in tqdm.tqdm(iterator):
         intervals = []
@@ -2096,10 +2100,21 @@ def add_breakpoints_to_recombinant_metadata(ts):
             # the rightmost value that it can be.
             assert left <= right
             intervals.append((left, right + 1))
-        row = tables.nodes[child]
-        md = row.metadata
+        md = ts.node(child).metadata
         md["breakpoint_intervals"] = intervals
-        # Note this isn't very efficient - would possibly be better to flush
-        # the whole column out at the end
-        tables.nodes[child] = row.replace(metadata=md)
+        node_metadata[child] = md
+    update_node_metadata(tables, node_metadata)
     return tables.tree_sequence()
+
+
+def update_node_metadata(tables, node_metadata):
+    """
+    Set the metadata for the nodes in the specified mapping of node IDs to
+    metadata dictionaries, writing the metadata column out once rather than
+    once per updated node.
+    """
+    schema = tables.nodes.metadata_schema
+    metadata = tskit.unpack_bytes(tables.nodes.metadata, tables.nodes.metadata_offset)
+    for u, md in node_metadata.items():
+        metadata[u] = schema.validate_and_encode_row(md)
+    tables.nodes.packset_metadata(metadata)
@@ -51,6 +51,26 @@ class TestEncodeAligment:
         a = convert.encode_alignment(h)
         assert_array_equal(a, [-1])
 
+    @pytest.mark.parametrize("hap", ["é", "一", "\u0100", "\U0001F600"])
+    def test_non_ascii_missing(self, hap):
+        h = np.array(list(hap), dtype="U1")
+        a = convert.encode_alignment(h)
+        assert_array_equal(a, [-1])
+
+    @pytest.mark.parametrize(
+        ["hap", "expected"],
+        [
+            (["AC", "A", "G"], [-1, 0, 2]),
+            (["A-", "--", "-"], [-1, -1, 4]),
+            (["ACGT", "T"], [-1, 3]),
+        ],
+    )
+    def test_multi_character_elements(self, hap, expected):
+        h = np.array(hap)
+        assert h.dtype != np.dtype("U1")
+        a = convert.encode_alignment(h)
+        assert_array_equal(a, expected)
+
     @pytest.mark.parametrize(
         "a",
         [
@@ -66,6 +86,67 @@ class TestEncodeAligment:
             convert.decode_alignment(np.array(a))
 
 
+class TestBaseComposition:
+    @pytest.mark.parametrize(
+        ["hap", "expected"],
+        [
+            ("", {}),
+            ("A", {"A": 1}),
+            ("ACGT-N", {"A": 1, "C": 1, "G": 1, "T": 1, "-": 1, "N": 1}),
+            ("TTAN-AT", {"T": 3, "A": 2, "N": 1, "-": 1}),
+            ("RYxA", {"R": 1, "Y": 1, "x": 1, "A": 1}),
+        ],
+    )
+    def test_examples(self, hap, expected):
+        h = np.array(list(hap), dtype="U1")
+        d = convert.base_composition(h)
+        assert d == expected
+        # Keys are in order of first occurrence
+        assert list(d.keys()) == list(expected.keys())
+
+    def test_multi_character_elements(self):
+        h = np.array(["AC", "A", "AC", "G"])
+        d = convert.base_composition(h)
+        assert d == {"AC": 2, "A": 1, "G": 1}
+        assert list(d.keys()) == ["AC", "A", "G"]
+
+
+class TestAlignmentStoreAppend:
+    def make_alignments(self, n):
+        rng = np.random.default_rng(1)
+        return {
+            f"strain_{j}": rng.choice(list("ACGT-N"), size=20).astype("U1")
+            for j in range(n)
+        }
+
+    def test_multiple_batches(self, tmp_path, monkeypatch):
+        data = self.make_alignments(7)
+        store = convert.AlignmentStore.initialise(str(tmp_path / "store.db"))
+        flushed = []
+        flush = store._flush
+
+        def recording_flush(chunk):
+            flushed.append(len(chunk))
+            flush(chunk)
+
+        monkeypatch.setattr(store, "_flush", recording_flush)
+        store.append(data, batch_size=3)
+        # Two full batches followed by the trailing partial batch
+        assert flushed == [3, 3, 1]
+        assert len(store) == len(data) + 1
+        for k, v in data.items():
+            assert_array_equal(store[k], v)
+        store.close()
+
+    @pytest.mark.parametrize("batch_size", [0, -1])
+    def test_bad_batch_size(self, tmp_path, batch_size):
+        data = self.make_alignments(2)
+        with convert.AlignmentStore.initialise(str(tmp_path / "store.db")) as store:
+            with pytest.raises(ValueError):
+                store.append(data, batch_size=batch_size)
+            assert len(store) == 1
+
+
 # TODO fixup these tests
 @pytest.mark.skip
 class TestMasking:
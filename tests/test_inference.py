@@ -1,3 +1,6 @@
+import concurrent.futures as cf
+import multiprocessing
+
 import numpy as np
 import pytest
 import tsinfer
@@ -156,6 +159,22 @@ class TestAddMatchingResults:
         assert var.alleles[var.genotypes[0]] == "X"
 
 
+@pytest.fixture(scope="module")
+def truncated_ref():
+    """
+    The initial ts truncated to its first 20 sites, and the encoded
+    reference haplotype at those sites.
+    """
+    ts = sc2ts.initial_ts()
+    tables = ts.dump_tables()
+    tables.sites.truncate(20)
+    ts = tables.tree_sequence()
+    ma = sc2ts.alignments.encode_and_mask(sc2ts.core.get_reference_sequence())
+    h = ma.alignment[ts.sites_position.astype(int)]
+    h.flags.writeable = False
+    return ts, h
+
+
 class TestMatchTsinfer:
     def match_tsinfer(self, samples, ts, haplotypes, **kwargs):
         assert len(samples) == len(haplotypes)
@@ -163,15 +182,11 @@ class TestMatchTsinfer:
         sc2ts.inference.match_tsinfer(samples=samples, ts=ts, genotypes=G, **kwargs)
 
     @pytest.mark.parametrize("mirror", [False, True])
-    def test_match_reference(self, mirror):
-        ts = sc2ts.initial_ts()
-        tables = ts.dump_tables()
-        tables.sites.truncate(20)
-        ts = tables.tree_sequence()
+    def test_match_reference(self, truncated_ref, mirror):
+        ts, ref = truncated_ref
         samples = util.get_samples(ts, [[(0, ts.sequence_length, 1)]])
         samples[0].alignment = sc2ts.core.get_reference_sequence()
-        ma = sc2ts.alignments.encode_and_mask(samples[0].alignment)
-        h = ma.alignment[ts.sites_position.astype(int)]
+        h = ref.copy()
         self.match_tsinfer(samples, ts, [h], mirror_coordinates=mirror)
         assert samples[0].breakpoints == [0, ts.sequence_length]
         assert samples[0].parents == [ts.num_nodes - 1]
@@ -179,15 +194,11 @@ class TestMatchTsinfer:
 
     @pytest.mark.parametrize("mirror", [False, True])
     @pytest.mark.parametrize("site_id", [0, 10, 19])
-    def test_match_reference_one_mutation(self, mirror, site_id):
-        ts = sc2ts.initial_ts()
-        tables = ts.dump_tables()
-        tables.sites.truncate(20)
-        ts = tables.tree_sequence()
+    def test_match_reference_one_mutation(self, truncated_ref, mirror, site_id):
+        ts, ref = truncated_ref
         samples = util.get_samples(ts, [[(0, ts.sequence_length, 1)]])
         samples[0].alignment = sc2ts.core.get_reference_sequence()
-        ma = sc2ts.alignments.encode_and_mask(samples[0].alignment)
-        h = ma.alignment[ts.sites_position.astype(int)]
+        h = ref.copy()
         # Mutate to gap
         h[site_id] = sc2ts.core.ALLELES.index("-")
         self.match_tsinfer(samples, ts, [h], mirror_coordinates=mirror)
@@ -204,27 +215,60 @@ class TestMatchTsinfer:
 
     @pytest.mark.parametrize("mirror", [False, True])
     @pytest.mark.parametrize("allele", range(5))
-    def test_match_reference_all_same(self, mirror, allele):
-        ts = sc2ts.initial_ts()
-        tables = ts.dump_tables()
-        tables.sites.truncate(20)
-        ts = tables.tree_sequence()
+    def test_match_reference_all_same(self, truncated_ref, mirror, allele):
+        ts, ref = truncated_ref
         samples = util.get_samples(ts, [[(0, ts.sequence_length, 1)]])
         samples[0].alignment = sc2ts.core.get_reference_sequence()
-        ma = sc2ts.alignments.encode_and_mask(samples[0].alignment)
-        ref = ma.alignment[ts.sites_position.astype(int)]
         h = np.zeros_like(ref) + allele
         self.match_tsinfer(samples, ts, [h], mirror_coordinates=mirror)
         assert samples[0].breakpoints == [0, ts.sequence_length]
         assert samples[0].parents == [ts.num_nodes - 1]
         muts = samples[0].mutations
         assert len(muts) > 0
-        assert len(muts) == np.sum(ref != allele)
-        for site_id, mut in zip(np.where(ref != allele)[0], muts):
+        diff_sites = np.flatnonzero(ref != allele)
+        assert len(muts) == len(diff_sites)
+        for site_id, mut in zip(diff_sites, muts):
             assert mut.site_id == site_id
             assert mut.derived_state == sc2ts.core.ALLELES[allele]
 
 
+class TestFetchAlignments:
+    def make_store(self, path, num_strains):
+        rng = np.random.default_rng(42)
+        ref = sc2ts.core.get_reference_sequence()
+        data = {}
+        for j in range(num_strains):
+            a = ref.copy()
+            sites = rng.integers(1, len(ref), size=10)
+            a[sites] = rng.choice(list("ACGT-N"), size=10)
+            data[f"strain_{j}"] = a
+        store = sc2ts.AlignmentStore.initialise(str(path))
+        store.append(data)
+        store.close()
+        return list(data.keys())
+
+    def test_serial_parallel_identical(self, tmp_path, monkeypatch):
+        # Lower the thresholds so that we exercise multiple chunks
+        monkeypatch.setattr(sc2ts.inference, "FETCH_ALIGNMENTS_MIN_PARALLEL", 5)
+        monkeypatch.setattr(sc2ts.inference, "FETCH_ALIGNMENTS_CHUNK_SIZE", 3)
+        path = tmp_path / "alignments.db"
+        strains = self.make_store(path, 10)
+        with sc2ts.AlignmentStore(str(path)) as store:
+            serial = sc2ts.inference.fetch_alignments(strains, store)
+            with cf.ProcessPoolExecutor(
+                max_workers=2, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                parallel = sc2ts.inference.fetch_alignments(
+                    strains, store, executor=executor
+                )
+        assert len(serial) == len(parallel) == len(strains)
+        for (a1, ma1), (a2, ma2) in zip(serial, parallel):
+            np.testing.assert_array_equal(a1, a2)
+            np.testing.assert_array_equal(ma1.alignment, ma2.alignment)
+            np.testing.assert_array_equal(ma1.masked_sites, ma2.masked_sites)
+            assert ma1.qc_summary() == ma2.qc_summary()
+
+
 class TestMatchPathTs:
     def match_path_ts(self, samples, ts):
         # FIXME this API is terrible
@@ -376,7 +420,7 @@ class TestMirrorTsCoords:
         ts2 = sc2ts.inference.mirror_ts_coordinates(ts1)
         assert ts2.num_sites == ts1.num_sites
         assert list(ts2.sites_position) == [0, 1, 4, 7, 9]
-        assert "".join(site.ancestral_state for site in ts2.sites()) == "TG-CA"
+        assert ts2.tables.sites.ancestral_state.tobytes().decode() == "TG-CA"
 
     def test_sparse_sites_example(self):
         tree = tskit.Tree.generate_balanced(2, span=100)
@@ -390,12 +434,14 @@ class TestMirrorTsCoords:
         ts2 = sc2ts.inference.mirror_ts_coordinates(ts1)
         assert ts2.num_sites == ts1.num_sites
         assert list(ts2.sites_position) == [80, 81, 84, 87, 89]
-        assert "".join(site.ancestral_state for site in ts2.sites()) == "TG-CA"
+        assert ts2.tables.sites.ancestral_state.tobytes().decode() == "TG-CA"
 
     def check_double_mirror(self, ts):
         mirror = sc2ts.inference.mirror_ts_coordinates(ts)
-        for h1, h2 in zip(ts.haplotypes(), mirror.haplotypes()):
-            assert h1 == h2[::-1]
+        alleles = tuple("ACGT")
+        G1 = ts.genotype_matrix(alleles=alleles)
+        G2 = mirror.genotype_matrix(alleles=alleles)
+        np.testing.assert_array_equal(G1, G2[::-1])
         double_mirror = sc2ts.inference.mirror_ts_coordinates(mirror)
         ts.tables.assert_equals(double_mirror.tables)
 
@@ -81,3 +81,20 @@ class TestDetachSingletonRecombinants:
         assert ts.num_samples == 4
         ts2 = utils.detach_singleton_recombinants(ts)
         ts.tables.assert_equals(ts2.tables, ignore_provenance=True)
+
+
+class TestUpdateNodeMetadata:
+    def test_no_updates(self):
+        ts = util.example_binary(2)
+        tables = ts.dump_tables()
+        utils.update_node_metadata(tables, {})
+        ts.tables.assert_equals(tables)
+
+    def test_updates(self):
+        ts = util.example_binary(3)
+        tables = ts.dump_tables()
+        node_metadata = {0: {"x": 1}, ts.num_nodes - 1: {"y": [1, 2]}}
+        utils.update_node_metadata(tables, node_metadata)
+        assert tables.nodes.num_rows == ts.num_nodes
+        for node, row in zip(ts.nodes(), tables.nodes):
+            assert row.metadata == node_metadata.get(node.id, node.metadata)